@@ -0,0 +1,218 @@
+"""
+Contact side effects and their arq worker.
+
+/contact either runs these helpers as FastAPI background tasks or, when
+REDIS_URL is set, enqueues a single ``process_contact`` job so the web
+worker never waits on Supabase, Resend or Chatwoot.
+
+Run the worker with:
+    arq contact_worker.WorkerSettings
+"""
+import asyncio
+import logging
+import os
+from html import escape
+from string import Template
+from typing import Annotated, Optional
+
+import httpx
+from arq.connections import RedisSettings
+from dotenv import load_dotenv
+from postgrest.types import ReturnMethod
+from pydantic import BaseModel, Field, StringConstraints
+from supabase import acreate_client, AsyncClient
+
+load_dotenv()  # Auto-load .env.local / .env
+logger = logging.getLogger("smarteros.contact")
+
+# Environment variables
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
+RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+RESEND_FROM = os.getenv("RESEND_FROM", "no-reply@smarterbot.cl")
+ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "smarterbotcl@gmail.com")
+CHATWOOT_BASE_URL = os.getenv("CHATWOOT_BASE_URL")  # e.g. https://chatwoot.smarterbot.cl
+CHATWOOT_TOKEN = os.getenv("CHATWOOT_TOKEN")        # Personal access token
+CHATWOOT_ACCOUNT_ID = os.getenv("CHATWOOT_ACCOUNT_ID")  # Numeric account id
+CHATWOOT_INBOX_ID = os.getenv("CHATWOOT_INBOX_ID")      # Numeric inbox id
+REDIS_URL = os.getenv("REDIS_URL")                  # e.g. redis://redis:6379/0 (enables the queue)
+
+
+# Cheap shape check validated in pydantic-core; skips email-validator's full parse on every submission
+_EMAIL_RE = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+Email = Annotated[str, StringConstraints(pattern=_EMAIL_RE, max_length=254)]
+
+
+class ContactRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200, description="Full name")
+    email: Email = Field(..., description="Email address")
+    message: str = Field(..., min_length=1, max_length=5000, description="Message content")
+    phone: Optional[str] = Field(None, max_length=50, description="Phone number (optional)")
+    source: Optional[str] = Field(None, max_length=100, description="Source domain")
+
+
+def new_http_client() -> httpx.AsyncClient:
+    """Pooled outbound client shared by every Resend/Chatwoot call in a process."""
+    return httpx.AsyncClient(
+        timeout=5.0,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        http2=True,
+    )
+
+
+async def new_supabase_client() -> Optional[AsyncClient]:
+    if not (SUPABASE_URL and SUPABASE_SERVICE_ROLE):
+        return None
+    return await acreate_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+
+
+async def insert_contact(supabase: AsyncClient, data: ContactRequest, domain: str):
+    """Insert the contact row (return=minimal: PostgREST sends no row back; errors raise APIError)"""
+    await supabase.table("contacts").insert({
+        "name": data.name,
+        "email": data.email,
+        "message": data.message,
+        "phone": data.phone,
+        "source": data.source,
+        "domain": domain,
+        "status": "new"
+    }, returning=ReturnMethod.minimal).execute()
+
+
+# Resend email templates (compiled once; values are HTML-escaped per send)
+RESEND_URL = "https://api.resend.com/emails"
+RESEND_HEADERS = {"Authorization": f"Bearer {RESEND_API_KEY}", "Content-Type": "application/json"}
+
+_USER_TPL = Template("""
+    <div style="font-family:Inter,system-ui,Segoe UI,Arial,sans-serif;max-width:600px;margin:0 auto">
+        <h2 style="color:#2563eb">¡Gracias, $name!</h2>
+        <p>Recibimos tu mensaje y te responderemos muy pronto.</p>
+        <div style="background:#f3f4f6;padding:1rem;border-radius:8px;margin:1rem 0">
+            <p style="margin:0"><strong>Tu mensaje:</strong></p>
+            <p style="margin:0.5rem 0 0 0;white-space:pre-wrap">$message</p>
+        </div>
+        <p>Puedes acceder al panel central en <a href="https://app.smarterbot.cl" style="color:#2563eb">app.smarterbot.cl</a>.</p>
+        <hr style="border:none;border-top:1px solid #e5e7eb;margin:2rem 0" />
+        <p style="color:#6b7280;font-size:0.875rem">Smarter OS - Automatización inteligente</p>
+    </div>
+""")
+
+_ADMIN_TPL = Template("""
+    <div style="font-family:Inter,system-ui,Segoe UI,Arial,sans-serif;max-width:600px;margin:0 auto">
+        <h3 style="color:#2563eb">Nuevo contacto recibido</h3>
+        <table style="width:100%;border-collapse:collapse">
+            <tr><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb"><strong>Nombre:</strong></td><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb">$name</td></tr>
+            <tr><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb"><strong>Email:</strong></td><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb"><a href="mailto:$email">$email</a></td></tr>
+            <tr><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb"><strong>WhatsApp:</strong></td><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb">$phone</td></tr>
+            <tr><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb"><strong>Source:</strong></td><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb">$source</td></tr>
+            <tr><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb"><strong>Domain:</strong></td><td style="padding:0.5rem 0;border-bottom:1px solid #e5e7eb">$domain</td></tr>
+        </table>
+        <div style="background:#f3f4f6;padding:1rem;border-radius:8px;margin:1rem 0">
+            <p style="margin:0"><strong>Mensaje:</strong></p>
+            <p style="margin:0.5rem 0 0 0;white-space:pre-wrap">$message</p>
+        </div>
+    </div>
+""")
+
+
+async def send_resend_emails(client: httpx.AsyncClient, data: ContactRequest, domain: str):
+    """Send confirmation email to user and notification to admin via Resend"""
+    if not RESEND_API_KEY:
+        return False
+    
+    name = escape(data.name)
+    message = escape(data.message)
+    
+    # User confirmation email
+    user_email_payload = {
+        "from": RESEND_FROM,
+        "to": [data.email],
+        "subject": "Gracias por contactar a Smarter OS",
+        "html": _USER_TPL.substitute(name=name, message=message),
+    }
+    
+    # Admin notification email
+    admin_email_payload = {
+        "from": RESEND_FROM,
+        "to": [ADMIN_EMAIL],
+        "subject": f"Nuevo contacto: {data.name} <{data.email}>",
+        "html": _ADMIN_TPL.substitute(
+            name=name,
+            email=escape(data.email),
+            phone=escape(data.phone or "-"),
+            source=escape(data.source or "-"),
+            domain=escape(domain),
+            message=message,
+        ),
+    }
+    
+    # Send both emails concurrently (fire and forget, don't block on failures)
+    await asyncio.gather(
+        client.post(RESEND_URL, json=user_email_payload, headers=RESEND_HEADERS, timeout=5.0),
+        client.post(RESEND_URL, json=admin_email_payload, headers=RESEND_HEADERS, timeout=5.0),
+        return_exceptions=True,
+    )
+    
+    return True
+
+
+async def create_chatwoot_conversation(client: httpx.AsyncClient, data: ContactRequest, domain: str):
+    """Optionally create a Chatwoot conversation (with its initial message) if env vars present."""
+    if not (CHATWOOT_BASE_URL and CHATWOOT_TOKEN and CHATWOOT_ACCOUNT_ID and CHATWOOT_INBOX_ID):
+        return False
+    payload = {
+        "source_id": f"lead-{data.email}",
+        "inbox_id": int(CHATWOOT_INBOX_ID),
+        "contact": {
+            "name": data.name,
+            "email": data.email,
+            "phone_number": data.phone or None,
+        },
+        "additional_attributes": {
+            "domain": domain,
+            "source": data.source,
+        },
+        # Chatwoot creates the first message together with the conversation
+        "message": {
+            "content": data.message,
+            "message_type": "incoming",
+        },
+    }
+    headers = {"Authorization": f"Bearer {CHATWOOT_TOKEN}", "Content-Type": "application/json"}
+    try:
+        conv_resp = await client.post(f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/conversations", json=payload, headers=headers, timeout=5.0)
+        return conv_resp.status_code in (200, 201)
+    except Exception:
+        return False
+
+
+# arq worker
+
+async def process_contact(ctx: dict, payload: dict):
+    """Queue job: store the contact, then send emails and open the Chatwoot conversation."""
+    domain = payload.pop("domain", "unknown")
+    data = ContactRequest(**payload)
+    if ctx["supabase"]:
+        await insert_contact(ctx["supabase"], data, domain)
+    await asyncio.gather(
+        send_resend_emails(ctx["http"], data, domain),
+        create_chatwoot_conversation(ctx["http"], data, domain),
+    )
+
+
+async def startup(ctx: dict):
+    ctx["http"] = new_http_client()
+    ctx["supabase"] = await new_supabase_client()
+    if not ctx["supabase"]:
+        logger.warning("Supabase not configured; contact jobs will only send notifications")
+
+
+async def shutdown(ctx: dict):
+    await ctx["http"].aclose()
+
+
+class WorkerSettings:
+    functions = [process_contact]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(REDIS_URL or "redis://localhost:6379")
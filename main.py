@@ -1,30 +1,45 @@
 import os
+import math
 import time
-from datetime import datetime
-from fastapi import FastAPI, Depends, HTTPException, Header, Request
+import logging
+from datetime import datetime, timezone
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_mcp import FastApiMCP
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 import httpx
+import orjson
 
 # Import routers
 from routers import runtime, runtime_ingest
 
-# Rate Limiting Config (desde env o default)
-RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "300"))
+logger = logging.getLogger("smarteros")
+logging.basicConfig(level=logging.INFO)
+
+# Rate Limiting Config (desde env o default); mínimo 1 para que el rellenado nunca sea 0
+RATE_LIMIT_RPM = max(1, int(os.getenv("RATE_LIMIT_RPM", "300")))
 
 # Tokens desde environment
 QWEN_API_KEY = os.getenv("QWEN_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 MCP_MODE = os.getenv("MCP_MODE", "governed")
+# ENABLE_MCP=false en réplicas de API cuando MCP corre como servicio dedicado (un solo proceso)
+MCP_ENABLED = os.getenv("ENABLE_MCP", "true").lower() in ("1", "true", "yes", "on")
+# PROFILING=1 habilita ?profile=1 (perfil pyinstrument en HTML); nunca activo por defecto
+PROFILING = os.getenv("PROFILING") == "1"
 
-# Almacenamiento en memoria para rate limiting
-_tenant_counters = {}
+# Almacenamiento en memoria para rate limiting: token bucket por tenant -> (tokens, último refill)
+_buckets: dict[bytes, tuple[float, float]] = {}
+_last_gc_window = 0
 
 app = FastAPI(
     title="SmarterOS API with MCP",
     description="Enterprise API with FastAPI-MCP integration and rate limiting",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # CORS
@@ -32,69 +47,153 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],  # DELETE: cierre de sesión MCP
+    allow_headers=["Authorization", "Content-Type", "Mcp-Session-Id", "Mcp-Protocol-Version"],
+    expose_headers=["Mcp-Session-Id"],  # el cliente MCP en browser debe poder leer la sesión
+    max_age=86400,  # cachear preflight 24h
 )
 
+# Compresión gzip para respuestas > 1 KB (completions, registry)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Timestamp ISO (UTC, resolución de segundos) cacheado por segundo: un time.time() y una
+# comparación por llamada; solo se formatea cuando cambia el segundo
+_ts_cache = [0, ""]
+
+def _iso_now() -> str:
+    t = int(time.time())
+    if t != _ts_cache[0]:
+        _ts_cache[0] = t
+        _ts_cache[1] = datetime.fromtimestamp(t, timezone.utc).isoformat()
+    return _ts_cache[1]
+
+@app.on_event("startup")
+async def startup():
+    """Pool de conexiones HTTP compartido para Qwen/OpenRouter (uno por worker)"""
+    app.state.http = httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        http2=True,
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.http.aclose()
+
 # Rate Limiting Middleware
-def get_tenant_from_token(auth_header: str):
-    """Extract tenant/RUT from Authorization header"""
-    if not auth_header or not auth_header.startswith("Bearer "):
+def get_tenant_from_token(auth_header: bytes):
+    """Extract tenant/RUT from the raw Authorization header bytes"""
+    if not auth_header or not auth_header.startswith(b"Bearer "):
         return None
     
     # Simple extraction: use token as tenant ID
     # En producción real, decodificar JWT y extraer RUT
-    token = auth_header.replace("Bearer ", "")
-    return token[:20]  # Primeros 20 chars como tenant ID
+    return auth_header[7:27]  # Primeros 20 bytes del token como tenant ID (bytes, sin decode)
 
-@app.middleware("http")
-async def tenant_rate_limit_middleware(request: Request, call_next):
-    """Rate limiting middleware por tenant"""
-    
-    # Rutas públicas sin límite
-    if request.url.path in ["/", "/health", "/docs", "/openapi.json", "/redoc"]:
-        return await call_next(request)
-    
-    auth = request.headers.get("Authorization")
-    tenant = get_tenant_from_token(auth)
-    
-    # Si no hay tenant (sin auth), no aplicar rate limit
-    if not tenant:
-        return await call_next(request)
-    
-    # Ventana de 1 minuto
-    now_window = int(time.time() // 60)
-    key = f"{tenant}:{now_window}"
-    
-    count = _tenant_counters.get(key, 0)
-    
-    if count >= RATE_LIMIT_RPM:
-        raise HTTPException(
-            status_code=429,
-            detail=f"Rate limit exceeded for tenant. Limit: {RATE_LIMIT_RPM} requests/minute",
-            headers={"X-RateLimit-Limit": str(RATE_LIMIT_RPM), "X-RateLimit-Remaining": "0"}
-        )
-    
-    _tenant_counters[key] = count + 1
-    
-    # Limpieza de ventanas antiguas
-    old_keys = [k for k in _tenant_counters.keys() if not k.endswith(str(now_window))]
-    for k in old_keys:
-        _tenant_counters.pop(k, None)
+# Rutas públicas sin límite
+PUBLIC_PATHS = frozenset({"/", "/health", "/docs", "/openapi.json", "/redoc"})
+_RATE_LIMIT_HEADER = str(RATE_LIMIT_RPM).encode()
+_REFILL_PER_SEC = RATE_LIMIT_RPM / 60.0
+
+def _gc_buckets(now: float):
+    """Como máximo una vez por minuto: elimina buckets que ya se rellenaron (equivalen a no existir)"""
+    global _last_gc_window
+    window = int(now // 60)
+    if window == _last_gc_window:
+        return
+    _last_gc_window = window
+    full = [t for t, (tokens, last) in _buckets.items() if tokens + (now - last) * _REFILL_PER_SEC >= RATE_LIMIT_RPM]
+    for t in full:
+        del _buckets[t]
+
+class TenantRateLimitMiddleware:
+    """Rate limiting por tenant como middleware ASGI puro (sin BaseHTTPMiddleware ni Request por request)"""
     
-    # Agregar headers de rate limit a la respuesta
-    response = await call_next(request)
-    response.headers["X-RateLimit-Limit"] = str(RATE_LIMIT_RPM)
-    response.headers["X-RateLimit-Remaining"] = str(RATE_LIMIT_RPM - count - 1)
-    response.headers["X-RateLimit-Reset"] = str((now_window + 1) * 60)
+    def __init__(self, app):
+        self.app = app
     
-    return response
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in PUBLIC_PATHS:
+            return await self.app(scope, receive, send)
+        
+        auth = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth = value
+                break
+        tenant = get_tenant_from_token(auth)
+        
+        # Si no hay tenant (sin auth), no aplicar rate limit
+        if not tenant:
+            return await self.app(scope, receive, send)
+        
+        # Token bucket: capacidad RATE_LIMIT_RPM, se rellena a RATE_LIMIT_RPM tokens/minuto.
+        # Relleno continuo: no hay borde de ventana, así que no se permiten 2× ráfagas al cambiar el minuto
+        # Una lectura y una sola escritura (tupla nueva) por request, sin await entre ambas: atómico en el event loop
+        now = time.time()
+        _gc_buckets(now)
+        tokens, last = _buckets.get(tenant, (RATE_LIMIT_RPM, now))
+        tokens = min(RATE_LIMIT_RPM, tokens + (now - last) * _REFILL_PER_SEC)
+        
+        if tokens < 1.0:
+            _buckets[tenant] = (tokens, now)
+            body = orjson.dumps({
+                "detail": f"Rate limit exceeded for tenant. Limit: {RATE_LIMIT_RPM} requests/minute"
+            })
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(math.ceil((1.0 - tokens) / _REFILL_PER_SEC)).encode()),
+                    (b"x-ratelimit-limit", _RATE_LIMIT_HEADER),
+                    (b"x-ratelimit-remaining", b"0"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        
+        tokens -= 1.0
+        _buckets[tenant] = (tokens, now)
+        
+        # Agregar headers de rate limit a la respuesta (reset = momento en que el bucket vuelve a estar lleno)
+        rate_headers = [
+            (b"x-ratelimit-limit", _RATE_LIMIT_HEADER),
+            (b"x-ratelimit-remaining", str(int(tokens)).encode()),
+            (b"x-ratelimit-reset", str(math.ceil(now + (RATE_LIMIT_RPM - tokens) / _REFILL_PER_SEC)).encode()),
+        ]
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *rate_headers]
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+app.add_middleware(TenantRateLimitMiddleware)
+
+# Profiling bajo demanda (import diferido: pyinstrument solo se carga con PROFILING=1)
+if PROFILING:
+    from fastapi import Request
+    from fastapi.responses import HTMLResponse
+    from pyinstrument import Profiler
 
-# Auth dependency
-async def verify_token(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
-    return authorization
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.query_params.get("profile") != "1":
+            return await call_next(request)
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        response = await call_next(request)
+        # Consumir el body para que las respuestas en streaming (/ai/*) queden dentro del perfil
+        async for _ in response.body_iterator:
+            pass
+        profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
+# Auth dependency (Bearer token; FastAPI rechaza si falta el header)
+security = HTTPBearer(auto_error=True)
 
 # Models
 class CompletionRequest(BaseModel):
@@ -107,29 +206,31 @@ class CompletionResponse(BaseModel):
     timestamp: str
     result: dict
 
-# Root endpoint
+# Root endpoint (metadata fija tras el arranque: se construye una vez)
+_ROOT_PAYLOAD = {
+    "name": "SmarterOS API MCP",
+    "version": "2.0.0",
+    "status": "running",
+    "docs": "/docs",
+    "health": "/health",
+    "mcp": "/mcp" if MCP_ENABLED else None,
+    "openapi": "/openapi.json",
+    "governed": MCP_MODE == "governed",
+    "rate_limit": {
+        "enabled": True,
+        "limit_rpm": RATE_LIMIT_RPM,
+        "mode": "memory"
+    },
+    "endpoints": {
+        "qwen": "/ai/qwen",
+        "openrouter": "/ai/openrouter"
+    }
+}
+
 @app.get("/")
-def root():
+async def root():
     """API root with metadata"""
-    return {
-        "name": "SmarterOS API MCP",
-        "version": "2.0.0",
-        "status": "running",
-        "docs": "/docs",
-        "health": "/health",
-        "mcp": "/mcp",
-        "openapi": "/openapi.json",
-        "governed": MCP_MODE == "governed",
-        "rate_limit": {
-            "enabled": True,
-            "limit_rpm": RATE_LIMIT_RPM,
-            "mode": "memory"
-        },
-        "endpoints": {
-            "qwen": "/ai/qwen",
-            "openrouter": "/ai/openrouter"
-        }
-    }
+    return _ROOT_PAYLOAD
 
 # Endpoints
 @app.get("/health")
@@ -137,8 +238,8 @@ async def health():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "mcp_enabled": True,
+        "timestamp": _iso_now(),
+        "mcp_enabled": MCP_ENABLED,
         "mcp_mode": MCP_MODE,
         "rate_limit_enabled": True,
         "rate_limit_rpm": RATE_LIMIT_RPM,
@@ -146,82 +247,88 @@ async def health():
         "openrouter_configured": bool(OPENROUTER_API_KEY)
     }
 
+async def stream_completion(provider: str, url: str, headers: dict, payload: dict) -> StreamingResponse:
+    """Reenvía el body del proveedor dentro del sobre CompletionResponse sin parsearlo ni re-serializarlo"""
+    client = app.state.http
+    upstream = await client.send(client.build_request("POST", url, headers=headers, json=payload), stream=True)
+    
+    if upstream.status_code != 200:
+        await upstream.aread()
+        await upstream.aclose()
+        raise HTTPException(
+            status_code=upstream.status_code,
+            detail=f"{provider} API error: {upstream.text}"
+        )
+    
+    # {"success":..,"governed":..,"timestamp":..,"result": <body upstream>}
+    envelope = orjson.dumps({
+        "success": True,
+        "governed": MCP_MODE == "governed",
+        "timestamp": _iso_now(),
+    })
+    
+    async def body():
+        yield envelope[:-1] + b',"result":'
+        async for chunk in upstream.aiter_bytes():
+            yield chunk
+        yield b"}"
+    
+    return StreamingResponse(
+        body(),
+        media_type="application/json",
+        background=BackgroundTask(upstream.aclose)
+    )
+
 @app.post("/ai/qwen", response_model=CompletionResponse)
 async def qwen_completion(
     request: CompletionRequest,
-    auth: str = Depends(verify_token)
+    auth: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Call Qwen API with governance"""
     if not QWEN_API_KEY:
         raise HTTPException(status_code=503, detail="Qwen API not configured")
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/text-generation/generation",
-                headers={
-                    "Authorization": f"Bearer {QWEN_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": request.model,
-                    "input": {"prompt": request.prompt},
-                    "parameters": {"result_format": "text"}
-                }
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Qwen API error: {response.text}"
-                )
-            
-            return CompletionResponse(
-                success=True,
-                governed=MCP_MODE == "governed",
-                timestamp=datetime.utcnow().isoformat(),
-                result=response.json()
-            )
+        return await stream_completion(
+            "Qwen",
+            "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/text-generation/generation",
+            headers={
+                "Authorization": f"Bearer {QWEN_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            payload={
+                "model": request.model,
+                "input": {"prompt": request.prompt},
+                "parameters": {"result_format": "text"}
+            }
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Qwen API timeout")
 
 @app.post("/ai/openrouter", response_model=CompletionResponse)
 async def openrouter_completion(
     request: CompletionRequest,
-    auth: str = Depends(verify_token)
+    auth: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Call OpenRouter API"""
     if not OPENROUTER_API_KEY:
         raise HTTPException(status_code=503, detail="OpenRouter API not configured")
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://smarteros.cl",
-                    "X-Title": "SmarterOS"
-                },
-                json={
-                    "model": request.model,
-                    "messages": [{"role": "user", "content": request.prompt}]
-                }
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"OpenRouter API error: {response.text}"
-                )
-            
-            return CompletionResponse(
-                success=True,
-                governed=MCP_MODE == "governed",
-                timestamp=datetime.utcnow().isoformat(),
-                result=response.json()
-            )
+        return await stream_completion(
+            "OpenRouter",
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://smarteros.cl",
+                "X-Title": "SmarterOS"
+            },
+            payload={
+                "model": request.model,
+                "messages": [{"role": "user", "content": request.prompt}]
+            }
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="OpenRouter API timeout")
 
@@ -229,25 +336,25 @@ async def openrouter_completion(
 app.include_router(runtime.router)
 app.include_router(runtime_ingest.router)
 
-# Initialize FastAPI-MCP
-mcp = FastApiMCP(app)
+# Initialize FastAPI-MCP (import diferido: sin costo de escaneo de rutas si está deshabilitado)
+if MCP_ENABLED:
+    from fastapi_mcp import FastApiMCP
+    mcp = FastApiMCP(app)
+    
+    # Mount MCP server HTTP endpoint
+    mcp.mount_http()
 
-# Mount MCP server HTTP endpoint
-mcp.mount_http()
+logger.info(
+    "smarteros_api_ready mcp_mode=%s mcp=%s rate_limit_rpm=%s qwen=%s openrouter=%s runtime_ingest=/mcp/runtime/ingest",
+    MCP_MODE, "/mcp" if MCP_ENABLED else "disabled", RATE_LIMIT_RPM, bool(QWEN_API_KEY), bool(OPENROUTER_API_KEY),
+)
 
-print("✅ SmarterOS API with MCP initialized")
-print(f"✅ MCP Mode: {MCP_MODE}")
-print(f"✅ Rate Limiting: ENABLED ({RATE_LIMIT_RPM} RPM)")
-print(f"✅ Qwen configured: {bool(QWEN_API_KEY)}")
-print(f"✅ OpenRouter configured: {bool(OPENROUTER_API_KEY)}")
-print(f"✅ MCP endpoint mounted at: /mcp")
-print(f"✅ Runtime Validator endpoint: /mcp/runtime/ingest")
+@app.post("/test/ping")
+async def test_ping(auth: HTTPAuthorizationCredentials = Depends(security)):
+    """Test endpoint for rate limiting"""
+    return {"pong": True, "timestamp": _iso_now()}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=3000)
-
-@app.post("/test/ping")
-async def test_ping(auth: str = Depends(verify_token)):
-    """Test endpoint for rate limiting"""
-    return {"pong": True, "timestamp": datetime.utcnow().isoformat()}
+    # uvloop + httptools vienen con uvicorn[standard]; se fijan explícitamente para no caer a asyncio/h11
+    uvicorn.run(app, host="0.0.0.0", port=3000, loop="uvloop", http="httptools", log_level="warning")
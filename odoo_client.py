@@ -1,28 +1,35 @@
 import os
-import time
+import random
 import logging
-from typing import Any, Dict, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Union
 import httpx
+import orjson
 import asyncio
 
 logger = logging.getLogger("odoo")
 
+def _as_ids(ids: Union[int, Sequence[int]]) -> List[int]:
+    """Normalize a single record id or a sequence of ids to Odoo's ids list"""
+    return [ids] if isinstance(ids, int) else list(ids)
+
 class OdooClient:
     """Async client wrapper for Odoo 19 External JSON-2 API.
 
     Provides a minimal abstraction for calling model methods:
     - search_read
-    - create
-    - write
-    - unlink
+    - create / create_many
+    - write (one id or a batch of ids)
+    - unlink (one id or a batch of ids)
     - arbitrary method via call
 
     Configuration via environment variables:
       ODOO_URL       Base URL (e.g. https://erp.smarterbot.cl)
       ODOO_DB        Database name (e.g. smarterbot_prod)
       ODOO_API_KEY   User API key (bearer token)
+      ODOO_MAX_CONN  Connection pool size (default 100)
 
-    Basic retry with exponential backoff for transient network or 5xx errors.
+    Basic retry with jittered exponential backoff for transient network or 5xx errors,
+    honouring Retry-After on 429/503 up to the client timeout (longer waits fail fast).
     """
 
     def __init__(self,
@@ -38,7 +45,10 @@ class OdooClient:
         self.timeout = timeout
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
-        self._semaphore = asyncio.Semaphore(int(os.getenv("ODOO_MAX_CONCURRENCY", "8")))
+        self.max_connections = int(os.getenv("ODOO_MAX_CONN", "100"))
+        self._client: Optional[httpx.AsyncClient] = None
+        # api_key/db are fixed after construction, so the headers are built once
+        self._cached_headers = self._headers()
         if not (self.base_url and self.db and self.api_key):
             logger.warning("OdooClient incomplete config: ODOO_URL/ODOO_DB/ODOO_API_KEY required")
 
@@ -49,52 +59,91 @@ class OdooClient:
             "X-Odoo-Database": self.db,
         }
 
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the singleton can be built at import time, outside the event loop
+        if self._client is None or self._client.is_closed:
+            # The pool limit is the backpressure: callers past max_connections wait for a free slot
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                # Connect failures are retried by the transport itself and
+                # don't count against max_retries; http2/limits must live on the transport too
+                transport=httpx.AsyncHTTPTransport(
+                    http2=True,
+                    retries=2,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=40,
+                        keepalive_expiry=30.0,
+                    ),
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     async def _request(self, model: str, method: str, payload: Dict[str, Any]) -> Any:
         if not (self.base_url and self.db and self.api_key):
             raise RuntimeError("Odoo client not configured")
         url = f"{self.base_url}/json/2/{model}/{method}"
         attempt = 0
         last_exc: Optional[Exception] = None
-        async with self._semaphore:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                while attempt <= self.max_retries:
-                    try:
-                        start = time.perf_counter()
-                        resp = await client.post(url, json=payload, headers=self._headers())
-                        latency_ms = int((time.perf_counter() - start) * 1000)
-                        if resp.status_code >= 500:
-                            raise httpx.HTTPStatusError("Server error", request=resp.request, response=resp)
-                        resp.raise_for_status()
-                        data = resp.json()
-                        logger.info(f"odoo_call model={model} method={method} status={resp.status_code} latency_ms={latency_ms}")
-                        return {"ok": True, "data": data, "latency_ms": latency_ms}
-                    except (httpx.HTTPError, httpx.TimeoutException) as e:
-                        last_exc = e
-                        attempt += 1
-                        if attempt > self.max_retries:
+        client = self._get_client()
+        loop = asyncio.get_running_loop()
+        while attempt <= self.max_retries:
+            try:
+                start = loop.time()
+                resp = await client.post(url, json=payload, headers=self._cached_headers)
+                latency_ms = int((loop.time() - start) * 1000)
+                if resp.status_code >= 500:
+                    raise httpx.HTTPStatusError("Server error", request=resp.request, response=resp)
+                resp.raise_for_status()
+                data = orjson.loads(resp.content)
+                logger.info(f"odoo_call model={model} method={method} status={resp.status_code} latency_ms={latency_ms}")
+                return {"ok": True, "data": data, "latency_ms": latency_ms}
+            except (httpx.HTTPError, httpx.TimeoutException) as e:
+                last_exc = e
+                attempt += 1
+                if attempt > self.max_retries:
+                    break
+                # Jitter so concurrent callers don't retry in lock-step against a recovering Odoo
+                sleep_time = self.backoff_factor * (2 ** (attempt - 1)) * (0.5 + random.random())
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (429, 503):
+                    retry_after = e.response.headers.get("retry-after", "")
+                    if retry_after.isdigit():
+                        wait = float(retry_after)
+                        if wait > self.timeout:
+                            # Odoo wants longer than a call may take: fail now instead of holding the request
                             break
-                        sleep_time = self.backoff_factor * (2 ** (attempt - 1))
-                        await asyncio.sleep(sleep_time)
-                # exhausted
-                logger.error(f"odoo_call_failed model={model} method={method} error={last_exc}")
-                raise last_exc or RuntimeError("Unknown Odoo error")
+                        sleep_time = max(sleep_time, wait)
+                await asyncio.sleep(sleep_time)
+        # exhausted
+        logger.error(f"odoo_call_failed model={model} method={method} error={last_exc}")
+        raise last_exc or RuntimeError("Unknown Odoo error")
 
     # Public helpers
     async def search_read(self, model: str, domain: Sequence[Any], fields: Sequence[str], limit: int = 80) -> Any:
         return await self._request(model, "search_read", {
             "domain": domain,
-            "fields": list(fields),
+            # lists/tuples serialize as JSON arrays as-is; only copy other sequences
+            "fields": fields if isinstance(fields, (list, tuple)) else list(fields),
             "limit": limit,
         })
 
     async def create(self, model: str, values: Dict[str, Any]) -> Any:
         return await self._request(model, "create", {"values": values})
 
-    async def write(self, model: str, record_id: int, values: Dict[str, Any]) -> Any:
-        return await self._request(model, "write", {"ids": [record_id], "values": values})
+    async def create_many(self, model: str, values_list: List[Dict[str, Any]]) -> Any:
+        # Odoo's create is batch-native (vals_list): N records in one round-trip
+        return await self._request(model, "create", {"vals_list": values_list})
+
+    async def write(self, model: str, ids: Union[int, Sequence[int]], values: Dict[str, Any]) -> Any:
+        return await self._request(model, "write", {"ids": _as_ids(ids), "values": values})
 
-    async def unlink(self, model: str, record_id: int) -> Any:
-        return await self._request(model, "unlink", {"ids": [record_id]})
+    async def unlink(self, model: str, ids: Union[int, Sequence[int]]) -> Any:
+        return await self._request(model, "unlink", {"ids": _as_ids(ids)})
 
     async def call(self, model: str, method: str, params: Dict[str, Any]) -> Any:
         return await self._request(model, method, params)
@@ -0,0 +1,14 @@
+from fastapi import HTTPException, Request
+import httpx
+import logging
+
+
+async def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Shared pooled client opened by the app on startup"""
+    return request.app.state.http
+
+
+def upstream_error(response: httpx.Response, service: str) -> HTTPException:
+    """502 for a non-2xx upstream response, without building an httpx.HTTPStatusError"""
+    logging.getLogger(f"smarteros.{service.lower()}").error(f"{service} API error: HTTP {response.status_code}")
+    return HTTPException(status_code=502, detail=f"{service} API error: HTTP {response.status_code}")
@@ -0,0 +1,9 @@
+import os
+
+# Los inserts grandes se parten en lotes (límite de request de PostgREST, latencia estable).
+# Mínimo 1: con 0 range() falla y con un valor negativo no se insertaría nada.
+INGEST_BATCH_SIZE = max(1, int(os.getenv("RUNTIME_INGEST_BATCH_SIZE", "500")))
+
+def chunks(records: list, size: int = INGEST_BATCH_SIZE):
+    for i in range(0, len(records), size):
+        yield records[i:i + size]
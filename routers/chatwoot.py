@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional, Dict, Any, List
 import httpx
+import orjson
 import os
 import logging
+from routers._http import get_http_client, upstream_error
 
 logger = logging.getLogger("smarteros.chatwoot")
 
@@ -14,16 +17,25 @@ CHATWOOT_TOKEN = os.getenv("CHATWOOT_TOKEN")
 CHATWOOT_ACCOUNT_ID = os.getenv("CHATWOOT_ACCOUNT_ID")
 CHATWOOT_INBOX_ID = os.getenv("CHATWOOT_INBOX_ID")
 
+# Endpoint URLs are fixed at process start; per-id paths just append to these
+CHATWOOT_ACCOUNT_URL = f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}"
+CHATWOOT_CONTACTS_URL = f"{CHATWOOT_ACCOUNT_URL}/contacts"
+CHATWOOT_CONVERSATIONS_URL = f"{CHATWOOT_ACCOUNT_URL}/conversations"
+
+
+# Built once: the token is read from the environment at import time
+CHATWOOT_HEADERS = {
+    "api_access_token": CHATWOOT_TOKEN,
+    "Content-Type": "application/json"
+} if CHATWOOT_TOKEN else None
+
 
 def get_chatwoot_headers():
     """Get Chatwoot API headers with authentication"""
-    if not CHATWOOT_TOKEN:
+    if not CHATWOOT_HEADERS:
         raise HTTPException(status_code=503, detail="Chatwoot token not configured")
     
-    return {
-        "api_access_token": CHATWOOT_TOKEN,
-        "Content-Type": "application/json"
-    }
+    return CHATWOOT_HEADERS
 
 
 class CreateContactRequest(BaseModel):
@@ -48,7 +60,7 @@ class SendMessageRequest(BaseModel):
 
 
 @router.post("/contacts", summary="Create Chatwoot contact")
-async def create_contact(req: CreateContactRequest):
+async def create_contact(req: CreateContactRequest, client=Depends(get_http_client)):
     """Create a new contact in Chatwoot"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
@@ -62,15 +74,16 @@ async def create_contact(req: CreateContactRequest):
         if req.custom_attributes:
             payload["custom_attributes"] = req.custom_attributes
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/contacts",
-                headers=get_chatwoot_headers(),
-                json=payload
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "contact": response.json().get("payload")}
+        response = await client.post(
+            CHATWOOT_CONTACTS_URL,
+            headers=get_chatwoot_headers(),
+            json=payload,
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        
+        return {"ok": True, "contact": orjson.loads(response.content).get("payload")}
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot contact creation error: {e}")
@@ -78,26 +91,27 @@ async def create_contact(req: CreateContactRequest):
 
 
 @router.get("/contacts", summary="List Chatwoot contacts")
-async def list_contacts(page: int = 1, sort: str = "name"):
+async def list_contacts(page: int = 1, sort: str = "name", client=Depends(get_http_client)):
     """List contacts from Chatwoot"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/contacts",
-                headers=get_chatwoot_headers(),
-                params={"page": page, "sort": sort}
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "ok": True,
-                "contacts": data.get("payload", []),
-                "meta": data.get("meta", {})
-            }
+        response = await client.get(
+            CHATWOOT_CONTACTS_URL,
+            headers=get_chatwoot_headers(),
+            params={"page": page, "sort": sort},
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        data = orjson.loads(response.content)
+        
+        return {
+            "ok": True,
+            "contacts": data.get("payload", []),
+            "meta": data.get("meta", {})
+        }
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot API error: {e}")
@@ -105,20 +119,21 @@ async def list_contacts(page: int = 1, sort: str = "name"):
 
 
 @router.get("/contacts/{contact_id}", summary="Get contact details")
-async def get_contact(contact_id: int):
+async def get_contact(contact_id: int, client=Depends(get_http_client)):
     """Get details of a specific contact"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/contacts/{contact_id}",
-                headers=get_chatwoot_headers()
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "contact": response.json().get("payload")}
+        response = await client.get(
+            f"{CHATWOOT_CONTACTS_URL}/{contact_id}",
+            headers=get_chatwoot_headers(),
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        
+        return {"ok": True, "contact": orjson.loads(response.content).get("payload")}
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot API error: {e}")
@@ -126,7 +141,7 @@ async def get_contact(contact_id: int):
 
 
 @router.post("/conversations", summary="Create Chatwoot conversation")
-async def create_conversation(req: CreateConversationRequest):
+async def create_conversation(req: CreateConversationRequest, client=Depends(get_http_client)):
     """Create a new conversation in Chatwoot"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
@@ -145,15 +160,16 @@ async def create_conversation(req: CreateConversationRequest):
         if req.source_id:
             payload["source_id"] = req.source_id
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/conversations",
-                headers=get_chatwoot_headers(),
-                json=payload
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "conversation": response.json()}
+        response = await client.post(
+            CHATWOOT_CONVERSATIONS_URL,
+            headers=get_chatwoot_headers(),
+            json=payload,
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        
+        return {"ok": True, "conversation": orjson.loads(response.content)}
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot conversation creation error: {e}")
@@ -161,26 +177,28 @@ async def create_conversation(req: CreateConversationRequest):
 
 
 @router.get("/conversations", summary="List conversations")
-async def list_conversations(status: str = "open", page: int = 1):
+async def list_conversations(status: str = "open", page: int = 1, client=Depends(get_http_client)):
     """List conversations from Chatwoot"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/conversations",
-                headers=get_chatwoot_headers(),
-                params={"status": status, "page": page}
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "ok": True,
-                "conversations": data.get("data", {}).get("payload", []),
-                "meta": data.get("data", {}).get("meta", {})
-            }
+        response = await client.get(
+            CHATWOOT_CONVERSATIONS_URL,
+            headers=get_chatwoot_headers(),
+            params={"status": status, "page": page},
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        data = orjson.loads(response.content).get("data", {})
+        
+        # Large payloads: returning the response directly skips FastAPI's jsonable_encoder walk
+        return ORJSONResponse({
+            "ok": True,
+            "conversations": data.get("payload", []),
+            "meta": data.get("meta", {})
+        })
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot API error: {e}")
@@ -188,7 +206,7 @@ async def list_conversations(status: str = "open", page: int = 1):
 
 
 @router.post("/conversations/{conversation_id}/messages", summary="Send message to conversation")
-async def send_message(conversation_id: int, req: SendMessageRequest):
+async def send_message(conversation_id: int, req: SendMessageRequest, client=Depends(get_http_client)):
     """Send a message to a Chatwoot conversation"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
@@ -200,15 +218,16 @@ async def send_message(conversation_id: int, req: SendMessageRequest):
             "private": req.private
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/conversations/{conversation_id}/messages",
-                headers=get_chatwoot_headers(),
-                json=payload
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "message": response.json()}
+        response = await client.post(
+            f"{CHATWOOT_CONVERSATIONS_URL}/{conversation_id}/messages",
+            headers=get_chatwoot_headers(),
+            json=payload,
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        
+        return {"ok": True, "message": orjson.loads(response.content)}
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot message send error: {e}")
@@ -216,20 +235,21 @@ async def send_message(conversation_id: int, req: SendMessageRequest):
 
 
 @router.get("/conversations/{conversation_id}/messages", summary="Get conversation messages")
-async def get_messages(conversation_id: int):
+async def get_messages(conversation_id: int, client=Depends(get_http_client)):
     """Get messages from a Chatwoot conversation"""
     if not CHATWOOT_ACCOUNT_ID:
         raise HTTPException(status_code=503, detail="Chatwoot account ID not configured")
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/conversations/{conversation_id}/messages",
-                headers=get_chatwoot_headers()
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "messages": response.json().get("payload", [])}
+        response = await client.get(
+            f"{CHATWOOT_CONVERSATIONS_URL}/{conversation_id}/messages",
+            headers=get_chatwoot_headers(),
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "Chatwoot")
+        
+        return ORJSONResponse({"ok": True, "messages": orjson.loads(response.content).get("payload", [])})
     
     except httpx.HTTPError as e:
         logger.error(f"Chatwoot API error: {e}")
@@ -237,7 +257,7 @@ async def get_messages(conversation_id: int):
 
 
 @router.get("/health", summary="Check Chatwoot API health")
-async def chatwoot_health():
+async def chatwoot_health(client=Depends(get_http_client)):
     """Check if Chatwoot API is accessible and configured"""
     try:
         configured = all([CHATWOOT_TOKEN, CHATWOOT_ACCOUNT_ID, CHATWOOT_INBOX_ID])
@@ -256,15 +276,22 @@ async def chatwoot_health():
             }
         
         # Test API connectivity
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                f"{CHATWOOT_BASE_URL}/api/v1/accounts/{CHATWOOT_ACCOUNT_ID}/contacts",
-                headers=get_chatwoot_headers(),
-                params={"page": 1}
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "status": "healthy", "configured": True}
+        response = await client.get(
+            CHATWOOT_CONTACTS_URL,
+            headers=get_chatwoot_headers(),
+            params={"page": 1},
+            timeout=5.0
+        )
+        if not response.is_success:
+            logger.error(f"Chatwoot health check failed: HTTP {response.status_code}")
+            return {
+                "ok": False,
+                "status": "unhealthy",
+                "error": f"HTTP {response.status_code}",
+                "configured": True
+            }
+        
+        return {"ok": True, "status": "healthy", "configured": True}
     
     except Exception as e:
         logger.error(f"Chatwoot health check failed: {e}")
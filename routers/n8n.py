@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 import httpx
+import orjson
 import os
 import logging
+from routers._http import get_http_client, upstream_error
 
 logger = logging.getLogger("smarteros.n8n")
 
@@ -12,17 +14,26 @@ router = APIRouter(prefix="/n8n", tags=["n8n"])
 N8N_BASE_URL = os.getenv("N8N_BASE_URL", "https://n8n.smarterbot.cl")
 N8N_API_KEY = os.getenv("N8N_API_KEY")
 
+# Endpoint URLs are fixed at process start; per-id paths just append to these
+N8N_WORKFLOWS_URL = f"{N8N_BASE_URL}/api/v1/workflows"
+N8N_EXECUTIONS_URL = f"{N8N_BASE_URL}/api/v1/executions"
+N8N_HEALTH_URL = f"{N8N_BASE_URL}/healthz"
+
+
+# Built once: the key is read from the environment at import time
+N8N_HEADERS = {
+    "X-N8N-API-KEY": N8N_API_KEY,
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+} if N8N_API_KEY else None
+
 
 def get_n8n_headers():
     """Get n8n API headers with authentication"""
-    if not N8N_API_KEY:
+    if not N8N_HEADERS:
         raise HTTPException(status_code=503, detail="n8n API key not configured")
     
-    return {
-        "X-N8N-API-KEY": N8N_API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+    return N8N_HEADERS
 
 
 class ExecuteWorkflowRequest(BaseModel):
@@ -31,27 +42,28 @@ class ExecuteWorkflowRequest(BaseModel):
 
 
 @router.get("/workflows", summary="List n8n workflows")
-async def list_workflows(active: Optional[bool] = None, limit: int = 100):
+async def list_workflows(active: Optional[bool] = None, limit: int = 100, client=Depends(get_http_client)):
     """List available n8n workflows"""
     try:
         params = {"limit": limit}
         if active is not None:
             params["active"] = str(active).lower()
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{N8N_BASE_URL}/api/v1/workflows",
-                headers=get_n8n_headers(),
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "ok": True,
-                "workflows": data.get("data", []),
-                "count": len(data.get("data", []))
-            }
+        response = await client.get(
+            N8N_WORKFLOWS_URL,
+            headers=get_n8n_headers(),
+            params=params,
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "n8n")
+        data = orjson.loads(response.content)
+        
+        return {
+            "ok": True,
+            "workflows": data.get("data", []),
+            "count": len(data.get("data", []))
+        }
     
     except httpx.HTTPError as e:
         logger.error(f"n8n API error: {e}")
@@ -59,17 +71,18 @@ async def list_workflows(active: Optional[bool] = None, limit: int = 100):
 
 
 @router.get("/workflows/{workflow_id}", summary="Get workflow details")
-async def get_workflow(workflow_id: str):
+async def get_workflow(workflow_id: str, client=Depends(get_http_client)):
     """Get details of a specific workflow"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{N8N_BASE_URL}/api/v1/workflows/{workflow_id}",
-                headers=get_n8n_headers()
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "workflow": response.json()}
+        response = await client.get(
+            f"{N8N_WORKFLOWS_URL}/{workflow_id}",
+            headers=get_n8n_headers(),
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "n8n")
+        
+        return {"ok": True, "workflow": orjson.loads(response.content)}
     
     except httpx.HTTPError as e:
         logger.error(f"n8n API error: {e}")
@@ -77,26 +90,27 @@ async def get_workflow(workflow_id: str):
 
 
 @router.post("/workflows/{workflow_id}/execute", summary="Execute workflow")
-async def execute_workflow(workflow_id: str, req: ExecuteWorkflowRequest):
+async def execute_workflow(workflow_id: str, req: ExecuteWorkflowRequest, client=Depends(get_http_client)):
     """
     Execute an n8n workflow with optional input data.
     Returns execution ID for tracking.
     """
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{N8N_BASE_URL}/api/v1/workflows/{workflow_id}/execute",
-                headers=get_n8n_headers(),
-                json=req.data or {}
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            return {
-                "ok": True,
-                "execution_id": result.get("data", {}).get("executionId"),
-                "result": result
-            }
+        response = await client.post(
+            f"{N8N_WORKFLOWS_URL}/{workflow_id}/execute",
+            headers=get_n8n_headers(),
+            json=req.data or {},
+            timeout=30.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "n8n")
+        result = orjson.loads(response.content)
+        
+        return {
+            "ok": True,
+            "execution_id": result.get("data", {}).get("executionId"),
+            "result": result
+        }
     
     except httpx.HTTPError as e:
         logger.error(f"n8n execution error: {e}")
@@ -104,17 +118,18 @@ async def execute_workflow(workflow_id: str, req: ExecuteWorkflowRequest):
 
 
 @router.get("/executions/{execution_id}", summary="Get execution status")
-async def get_execution(execution_id: str):
+async def get_execution(execution_id: str, client=Depends(get_http_client)):
     """Get the status and result of a workflow execution"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{N8N_BASE_URL}/api/v1/executions/{execution_id}",
-                headers=get_n8n_headers()
-            )
-            response.raise_for_status()
-            
-            return {"ok": True, "execution": response.json()}
+        response = await client.get(
+            f"{N8N_EXECUTIONS_URL}/{execution_id}",
+            headers=get_n8n_headers(),
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "n8n")
+        
+        return {"ok": True, "execution": orjson.loads(response.content)}
     
     except httpx.HTTPError as e:
         logger.error(f"n8n API error: {e}")
@@ -122,27 +137,28 @@ async def get_execution(execution_id: str):
 
 
 @router.get("/executions", summary="List recent executions")
-async def list_executions(limit: int = 20, workflow_id: Optional[str] = None):
+async def list_executions(limit: int = 20, workflow_id: Optional[str] = None, client=Depends(get_http_client)):
     """List recent workflow executions"""
     try:
         params = {"limit": limit}
         if workflow_id:
             params["workflowId"] = workflow_id
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{N8N_BASE_URL}/api/v1/executions",
-                headers=get_n8n_headers(),
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "ok": True,
-                "executions": data.get("data", []),
-                "count": len(data.get("data", []))
-            }
+        response = await client.get(
+            N8N_EXECUTIONS_URL,
+            headers=get_n8n_headers(),
+            params=params,
+            timeout=10.0
+        )
+        if not response.is_success:
+            raise upstream_error(response, "n8n")
+        data = orjson.loads(response.content)
+        
+        return {
+            "ok": True,
+            "executions": data.get("data", []),
+            "count": len(data.get("data", []))
+        }
     
     except httpx.HTTPError as e:
         logger.error(f"n8n API error: {e}")
@@ -150,21 +166,28 @@ async def list_executions(limit: int = 20, workflow_id: Optional[str] = None):
 
 
 @router.get("/health", summary="Check n8n API health")
-async def n8n_health():
+async def n8n_health(client=Depends(get_http_client)):
     """Check if n8n API is accessible"""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                f"{N8N_BASE_URL}/healthz",
-                headers={"Accept": "application/json"}
-            )
-            response.raise_for_status()
-            
+        response = await client.get(
+            N8N_HEALTH_URL,
+            headers={"Accept": "application/json"},
+            timeout=5.0
+        )
+        if not response.is_success:
+            logger.error(f"n8n health check failed: HTTP {response.status_code}")
             return {
-                "ok": True,
-                "status": "healthy",
+                "ok": False,
+                "status": "unhealthy",
+                "error": f"HTTP {response.status_code}",
                 "configured": bool(N8N_API_KEY)
             }
+        
+        return {
+            "ok": True,
+            "status": "healthy",
+            "configured": bool(N8N_API_KEY)
+        }
     
     except Exception as e:
         logger.error(f"n8n health check failed: {e}")
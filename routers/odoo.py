@@ -1,6 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from typing import Any, Dict, List, Optional, Type
+from pydantic import BaseModel, Field, ValidationError
+from cachetools import TLRUCache
+import hashlib
+import time
+import orjson
 from odoo_client import odoo_client
 
 router = APIRouter(prefix="/odoo", tags=["odoo"])
@@ -10,6 +15,7 @@ class SearchReadRequest(BaseModel):
     domain: List[Any] = Field(default_factory=list, description="Odoo domain array")
     fields: List[str] = Field(default_factory=list, description="Fields to return")
     limit: int = Field(80, ge=1, le=500, description="Max records")
+    cache_ttl: int = Field(30, ge=0, le=3600, description="Seconds to cache the result in-process (0 = bypass)")
 
 class CreateRequest(BaseModel):
     model: str
@@ -29,37 +35,88 @@ class GenericCallRequest(BaseModel):
     method: str
     params: Dict[str, Any] = Field(default_factory=dict)
 
-@router.post("/search_read")
-async def odoo_search_read(payload: SearchReadRequest):
+def json_body(model: Type[BaseModel]):
+    """Dependency validating the raw body with model_validate_json (no intermediate dict)"""
+    async def parse(request: Request):
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            # No input: json_invalid carries the raw body bytes, which the 422 handler can't decode if not UTF-8
+            raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False, include_input=False)])
+    return parse
+
+def body_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Keep the request body in the OpenAPI schema, since it no longer comes from a body parameter"""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
+
+# search_read results keyed by (model, blake2b of the query) -> (ttl, stored_at, result).
+# Entries live for the storing caller's cache_ttl; a reader only accepts one younger than its own.
+_search_cache = TLRUCache(maxsize=1024, ttu=lambda key, value, now: now + value[0], timer=time.monotonic)
+
+# Methods /odoo/call may run without clearing the cache; anything else can write.
+_READ_METHODS = frozenset({"read", "search", "search_read", "search_count", "fields_get"})
+
+def _search_key(payload: SearchReadRequest):
+    """Cache key for a query, or None if it can't be serialized (ints over 64 bits, non-str dict keys)"""
+    try:
+        query = orjson.dumps(payload.model_dump(exclude={"cache_ttl"}), option=orjson.OPT_SORT_KEYS)
+    except (TypeError, orjson.JSONEncodeError):
+        return None
+    return payload.model, hashlib.blake2b(query, digest_size=16).digest()
+
+def _invalidate(model: str) -> None:
+    """Drop cached reads of a model once a write through this router has settled (called from finally)"""
+    for key in [k for k in _search_cache if k[0] == model]:
+        _search_cache.pop(key, None)
+
+@router.post("/search_read", openapi_extra=body_schema(SearchReadRequest))
+async def odoo_search_read(payload: SearchReadRequest = Depends(json_body(SearchReadRequest))):
+    key = _search_key(payload) if payload.cache_ttl else None
+    if key is not None:
+        cached = _search_cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] <= payload.cache_ttl:
+            return cached[2]
     try:
-        return await odoo_client.search_read(payload.model, payload.domain, payload.fields, payload.limit)
+        result = await odoo_client.search_read(payload.model, payload.domain, payload.fields, payload.limit)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    if key is not None:
+        _search_cache[key] = (payload.cache_ttl, time.monotonic(), result)
+    return result
 
-@router.post("/create")
-async def odoo_create(payload: CreateRequest):
+@router.post("/create", openapi_extra=body_schema(CreateRequest))
+async def odoo_create(payload: CreateRequest = Depends(json_body(CreateRequest))):
     try:
         return await odoo_client.create(payload.model, payload.values)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        _invalidate(payload.model)
 
-@router.post("/write")
-async def odoo_write(payload: WriteRequest):
+@router.post("/write", openapi_extra=body_schema(WriteRequest))
+async def odoo_write(payload: WriteRequest = Depends(json_body(WriteRequest))):
     try:
         return await odoo_client.write(payload.model, payload.id, payload.values)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        _invalidate(payload.model)
 
-@router.post("/unlink")
-async def odoo_unlink(payload: UnlinkRequest):
+@router.post("/unlink", openapi_extra=body_schema(UnlinkRequest))
+async def odoo_unlink(payload: UnlinkRequest = Depends(json_body(UnlinkRequest))):
     try:
         return await odoo_client.unlink(payload.model, payload.id)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        _invalidate(payload.model)
 
-@router.post("/call")
-async def odoo_call(payload: GenericCallRequest):
+@router.post("/call", openapi_extra=body_schema(GenericCallRequest))
+async def odoo_call(payload: GenericCallRequest = Depends(json_body(GenericCallRequest))):
     try:
         return await odoo_client.call(payload.model, payload.method, payload.params)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        if payload.method not in _READ_METHODS:
+            _invalidate(payload.model)
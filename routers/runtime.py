@@ -3,26 +3,29 @@ Runtime Validator Ingestion Endpoint
 Recibe datos de Open-Scouts y los almacena en Supabase
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
-from supabase import create_client, Client
+import asyncio
+from supabase import acreate_client, AsyncClient
 from datetime import datetime
+from routers._ingest import chunks
 
-router = APIRouter(prefix="/mcp/runtime", tags=["runtime"])
+router = APIRouter(prefix="/mcp/runtime", tags=["runtime"], default_response_class=ORJSONResponse)
 
 # Supabase client (lazy initialization)
 _supabase_client = None
 
-def get_supabase() -> Client:
-    """Lazy initialization de Supabase client"""
+async def get_supabase() -> AsyncClient:
+    """Lazy initialization de Supabase client (async: no bloquea el event loop)"""
     global _supabase_client
     if _supabase_client is None:
         SUPABASE_URL = os.getenv("SUPABASE_URL")
         SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
         if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
             raise RuntimeError("SUPABASE_URL y SUPABASE_SERVICE_ROLE_KEY requeridos")
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+        _supabase_client = await acreate_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
     return _supabase_client
 
 
@@ -65,11 +68,23 @@ async def ingest_scout_data(payload: RuntimeIngestPayload):
     Inserta en las 4 tablas del Runtime Validator
     """
     
-    supabase = get_supabase()
+    # Scout sin datos ni metadata: no se registra ejecución (evita un insert inútil por poll vacío)
+    if not (payload.links or payload.urls_new or payload.urls_removed or payload.semantic_changes) and payload.metadata is None:
+        return {
+            "status": "noop",
+            "execution_id": None,
+            "links_validated": 0,
+            "urls_new": 0,
+            "urls_removed": 0,
+            "semantic_changes": 0,
+            "alerts_created": 0
+        }
+    
+    supabase = await get_supabase()
     
     try:
-        # 1. Crear ejecución
-        execution_result = supabase.table("runtime_executions").insert({
+        # 1. Crear ejecución (el resto de inserts depende de execution_id)
+        execution_result = await supabase.table("runtime_executions").insert({
             "tenant_id": payload.tenant_id,
             "scout_id": payload.scout_id,
             "domain": payload.domain,
@@ -79,73 +94,75 @@ async def ingest_scout_data(payload: RuntimeIngestPayload):
         
         execution_id = execution_result.data[0]["id"]
         
-        # 2. Insertar validaciones de links
-        if payload.links:
-            link_records = [
-                {
-                    "execution_id": execution_id,
-                    "url": link.url,
-                    "status_code": link.status_code,
-                    "redirect_target": link.redirect_target,
-                    "is_external": link.is_external
-                }
-                for link in payload.links
-            ]
-            supabase.table("runtime_link_validations").insert(link_records).execute()
-        
-        # 3. Insertar deltas de URLs (nuevas)
-        if payload.urls_new:
-            url_delta_records = [
-                {
-                    "execution_id": execution_id,
-                    "url": url,
-                    "delta_type": "new"
-                }
-                for url in payload.urls_new
-            ]
-            supabase.table("runtime_url_deltas").insert(url_delta_records).execute()
+        # Los inserts siguientes son independientes entre sí: se lanzan juntos con gather
+        inserts = []
         
-        # 4. Insertar deltas de URLs (removidas)
-        if payload.urls_removed:
-            url_removed_records = [
-                {
-                    "execution_id": execution_id,
-                    "url": url,
-                    "delta_type": "removed"
-                }
-                for url in payload.urls_removed
-            ]
-            supabase.table("runtime_url_deltas").insert(url_removed_records).execute()
+        # 2. Insertar validaciones de links (en la misma pasada se detectan los rotos)
+        link_records = []
+        broken_count = 0
+        broken_sample = []  # solo las primeras 5 URLs van en la alerta
+        for link in payload.links:
+            link_records.append({
+                "execution_id": execution_id,
+                "url": link.url,
+                "status_code": link.status_code,
+                "redirect_target": link.redirect_target,
+                "is_external": link.is_external
+            })
+            if link.status_code >= 400:
+                broken_count += 1
+                if len(broken_sample) < 5:
+                    broken_sample.append(link.url)
+        if link_records:
+            inserts.extend(supabase.table("runtime_link_validations").insert(batch).execute() for batch in chunks(link_records))
         
-        # 5. Insertar cambios semánticos
-        if payload.semantic_changes:
-            semantic_records = [
-                {
-                    "execution_id": execution_id,
-                    "url": change.url,
-                    "field_name": change.field_name,
-                    "old_value": change.old_value,
-                    "new_value": change.new_value,
-                    "impact_level": change.impact_level
-                }
-                for change in payload.semantic_changes
-            ]
-            supabase.table("runtime_semantic_deltas").insert(semantic_records).execute()
+        # 3-4. Insertar deltas de URLs (nuevas y removidas) en un solo insert por lote
+        url_delta_records = [
+            {
+                "execution_id": execution_id,
+                "url": url,
+                "delta_type": "new"
+            }
+            for url in payload.urls_new
+        ] + [
+            {
+                "execution_id": execution_id,
+                "url": url,
+                "delta_type": "removed"
+            }
+            for url in payload.urls_removed
+        ]
+        if url_delta_records:
+            inserts.extend(supabase.table("runtime_url_deltas").insert(batch).execute() for batch in chunks(url_delta_records))
         
-        # 6. Crear alertas si hay cambios críticos
-        critical_changes = [c for c in payload.semantic_changes if c.impact_level == "critical"]
-        broken_links = [l for l in payload.links if l.status_code >= 400]
+        # 5. Insertar cambios semánticos (en la misma pasada se detectan los críticos)
+        semantic_records = []
+        critical_changes = []
+        for change in payload.semantic_changes:
+            semantic_records.append({
+                "execution_id": execution_id,
+                "url": change.url,
+                "field_name": change.field_name,
+                "old_value": change.old_value,
+                "new_value": change.new_value,
+                "impact_level": change.impact_level
+            })
+            if change.impact_level == "critical":
+                critical_changes.append(change)
+        if semantic_records:
+            inserts.extend(supabase.table("runtime_semantic_deltas").insert(batch).execute() for batch in chunks(semantic_records))
         
+        # 6. Crear alertas si hay cambios críticos (solo dependen del payload)
         alerts = []
         
-        if broken_links:
+        if broken_count:
             alerts.append({
                 "execution_id": execution_id,
                 "type": "link_failure",
                 "severity": "critical",
                 "payload": {
-                    "broken_count": len(broken_links),
-                    "urls": [l.url for l in broken_links[:5]]
+                    "broken_count": broken_count,
+                    "urls": broken_sample
                 }
             })
         
@@ -161,7 +178,10 @@ async def ingest_scout_data(payload: RuntimeIngestPayload):
             })
         
         if alerts:
-            supabase.table("runtime_alerts").insert(alerts).execute()
+            inserts.append(supabase.table("runtime_alerts").insert(alerts).execute())
+        
+        if inserts:
+            await asyncio.gather(*inserts)
         
         return {
             "status": "ok",
@@ -181,7 +201,7 @@ async def ingest_scout_data(payload: RuntimeIngestPayload):
 async def runtime_health():
     """Health check del sistema de runtime"""
     try:
-        supabase = get_supabase()
+        supabase = await get_supabase()
         return {
             "status": "ok",
             "service": "runtime_validator",
@@ -1,30 +1,52 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Optional, Literal
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+from typing import Annotated, List, Optional, Literal
 from datetime import datetime
 import os
-from supabase import create_client, Client
+import asyncio
+from cachetools import TTLCache
+from supabase import acreate_client, AsyncClient
+from routers._ingest import chunks
 
-router = APIRouter(prefix="/mcp/runtime", tags=["Runtime Validator"])
+router = APIRouter(prefix="/mcp/runtime", tags=["Runtime Validator"], default_response_class=ORJSONResponse)
 
-# Supabase client
-def get_supabase() -> Client:
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not url or not key:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
-    return create_client(url, key)
+# Supabase client (uno por proceso: reutiliza el pool de conexiones de PostgREST)
+_supabase_client: Optional[AsyncClient] = None
+
+async def get_supabase() -> AsyncClient:
+    global _supabase_client
+    if _supabase_client is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise HTTPException(status_code=500, detail="Supabase not configured")
+        _supabase_client = await acreate_client(url, key)
+    return _supabase_client
+
+# Tenants verificados (los IDs no cambian entre ingestas): evita el round-trip en cada request
+_tenant_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
 
 # Schemas
+# Campos desconocidos de Open-Scouts se descartan; sin validación en asignación (los modelos solo se leen)
+_INGEST_MODEL_CONFIG = ConfigDict(extra="ignore", validate_assignment=False, arbitrary_types_allowed=False)
+
+# URLs como str validadas solo por esquema: se guardan tal cual llegan, sin parseo completo ni str() de vuelta
+HttpUrlStr = Annotated[str, StringConstraints(pattern=r"^https?://")]
+
 class LinkValidation(BaseModel):
-    url: HttpUrl
+    model_config = _INGEST_MODEL_CONFIG
+    
+    url: HttpUrlStr
     status_code: int
-    redirect_to: Optional[HttpUrl] = None
+    redirect_to: Optional[HttpUrlStr] = None
     is_external: bool
     is_broken: bool
 
 class SemanticChange(BaseModel):
-    url: HttpUrl
+    model_config = _INGEST_MODEL_CONFIG
+    
+    url: HttpUrlStr
     change_type: Literal["minor", "relevant", "critical"]
     field: str
     before: str
@@ -32,6 +54,8 @@ class SemanticChange(BaseModel):
     impact_score: float = Field(ge=0, le=1)
 
 class RuntimeIngestPayload(BaseModel):
+    model_config = _INGEST_MODEL_CONFIG
+    
     tenant_id: str
     scout_id: str
     domain: str
@@ -39,8 +63,8 @@ class RuntimeIngestPayload(BaseModel):
     execution_completed_at: datetime
     status: Literal["completed", "failed", "partial"]
     links: List[LinkValidation]
-    urls_new: List[HttpUrl] = []
-    urls_removed: List[HttpUrl] = []
+    urls_new: List[HttpUrlStr] = []
+    urls_removed: List[HttpUrlStr] = []
     semantic_changes: List[SemanticChange] = []
 
 class RuntimeIngestResponse(BaseModel):
@@ -52,7 +76,7 @@ class RuntimeIngestResponse(BaseModel):
 @router.post("/ingest", response_model=RuntimeIngestResponse)
 async def ingest_runtime_data(
     payload: RuntimeIngestPayload,
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase)
 ):
     """
     Ingesta de datos desde Open-Scouts hacia Runtime Validator
@@ -66,18 +90,20 @@ async def ingest_runtime_data(
     """
     
     try:
-        # 1. Verificar que el tenant existe
-        tenant_response = supabase.table("tenants") \
-            .select("id") \
-            .eq("id", payload.tenant_id) \
-            .single() \
-            .execute()
-        
-        if not tenant_response.data:
-            raise HTTPException(status_code=404, detail="Tenant not found")
+        # 1. Verificar que el tenant existe (solo se cachean los encontrados)
+        if payload.tenant_id not in _tenant_cache:
+            tenant_response = await supabase.table("tenants") \
+                .select("id") \
+                .eq("id", payload.tenant_id) \
+                .single() \
+                .execute()
+            
+            if not tenant_response.data:
+                raise HTTPException(status_code=404, detail="Tenant not found")
+            _tenant_cache[payload.tenant_id] = True
         
         # 2. Insertar ejecución
-        execution_response = supabase.table("runtime_executions").insert({
+        execution_response = await supabase.table("runtime_executions").insert({
             "tenant_id": payload.tenant_id,
             "scout_id": payload.scout_id,
             "domain": payload.domain,
@@ -88,71 +114,78 @@ async def ingest_runtime_data(
         
         execution_id = execution_response.data[0]["id"]
         
+        # Los inserts siguientes solo dependen de execution_id: se lanzan juntos con gather
+        inserts = []
+        
         # 3. Insertar validaciones de links
         link_records = []
+        broken_links = []
         for link in payload.links:
             link_records.append({
                 "execution_id": execution_id,
-                "url": str(link.url),
+                "url": link.url,
                 "status_code": link.status_code,
-                "redirect_to": str(link.redirect_to) if link.redirect_to else None,
+                "redirect_to": link.redirect_to,
                 "is_external": link.is_external,
                 "is_broken": link.is_broken
             })
+            if link.is_broken:
+                broken_links.append(link)
         
         if link_records:
-            supabase.table("runtime_link_validations").insert(link_records).execute()
+            inserts.extend(supabase.table("runtime_link_validations").insert(batch).execute() for batch in chunks(link_records))
         
         # 4. Insertar deltas de URLs
         url_delta_records = []
         for url in payload.urls_new:
             url_delta_records.append({
                 "execution_id": execution_id,
-                "url": str(url),
+                "url": url,
                 "change_type": "new"
             })
         for url in payload.urls_removed:
             url_delta_records.append({
                 "execution_id": execution_id,
-                "url": str(url),
+                "url": url,
                 "change_type": "removed"
             })
         
         if url_delta_records:
-            supabase.table("runtime_url_deltas").insert(url_delta_records).execute()
+            inserts.extend(supabase.table("runtime_url_deltas").insert(batch).execute() for batch in chunks(url_delta_records))
         
         # 5. Insertar cambios semánticos
         semantic_records = []
+        critical_changes = []
         for change in payload.semantic_changes:
             semantic_records.append({
                 "execution_id": execution_id,
-                "url": str(change.url),
+                "url": change.url,
                 "change_type": change.change_type,
                 "field": change.field,
                 "before_value": change.before,
                 "after_value": change.after,
                 "impact_score": change.impact_score
             })
+            if change.change_type == "critical":
+                critical_changes.append(change)
         
         if semantic_records:
-            supabase.table("runtime_semantic_deltas").insert(semantic_records).execute()
+            inserts.extend(supabase.table("runtime_semantic_deltas").insert(batch).execute() for batch in chunks(semantic_records))
         
         # 6. Crear alertas automáticas para eventos críticos
         alerts = []
         
         # Alertas por links rotos
-        broken_links = [l for l in payload.links if l.is_broken]
         if broken_links:
             alerts.append({
                 "execution_id": execution_id,
                 "type": "link_broken",
                 "severity": "critical",
                 "message": f"{len(broken_links)} enlaces rotos detectados",
-                "payload": {"broken_links": [str(l.url) for l in broken_links]}
+                "payload": {"broken_links": [l.url for l in broken_links]}
             })
         
         # Alertas por cambios semánticos críticos
-        critical_changes = [c for c in payload.semantic_changes if c.change_type == "critical"]
         if critical_changes:
             alerts.append({
                 "execution_id": execution_id,
@@ -161,7 +194,7 @@ async def ingest_runtime_data(
                 "message": f"{len(critical_changes)} cambios críticos detectados",
                 "payload": {"changes": [
                     {
-                        "url": str(c.url),
+                        "url": c.url,
                         "field": c.field,
                         "before": c.before,
                         "after": c.after
@@ -169,10 +202,12 @@ async def ingest_runtime_data(
                 ]}
             })
         
-        alerts_created = 0
         if alerts:
-            alert_response = supabase.table("runtime_alerts").insert(alerts).execute()
-            alerts_created = len(alert_response.data)
+            inserts.append(supabase.table("runtime_alerts").insert(alerts).execute())
+        
+        results = await asyncio.gather(*inserts) if inserts else []
+        # El insert de alertas es siempre el último de la lista
+        alerts_created = len(results[-1].data) if alerts else 0
         
         # 7. Respuesta
         return RuntimeIngestResponse(
@@ -1,23 +1,34 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, List, Any
+from postgrest.types import CountMethod
 import os
+import re
 import logging
 
 logger = logging.getLogger("smarteros.supabase")
 
 router = APIRouter(prefix="/supabase", tags=["supabase"])
 
+# "column" or "column.asc|desc"; column names containing "desc" (e.g. description) parse correctly
+_ORDER_RE = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)(?:\.(asc|desc))?$")
+
+# One client per process so its PostgREST connection pool is reused across requests
+_supabase_client = None
+
 # Lazy import to avoid dependency issues
 def get_supabase():
-    from supabase import create_client, Client
-    SUPABASE_URL = os.getenv("SUPABASE_URL")
-    SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
-    
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
-        raise HTTPException(status_code=503, detail="Supabase not configured")
-    
-    return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+    global _supabase_client
+    if _supabase_client is None:
+        from supabase import create_client, Client
+        SUPABASE_URL = os.getenv("SUPABASE_URL")
+        SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
+        
+        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
+            raise HTTPException(status_code=503, detail="Supabase not configured")
+        
+        _supabase_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+    return _supabase_client
 
 
 class QueryRequest(BaseModel):
@@ -47,6 +58,13 @@ class DeleteRequest(BaseModel):
 @router.post("/query", summary="Query Supabase table")
 async def query_table(req: QueryRequest, supabase=Depends(get_supabase)):
     """Query a Supabase table with filters, ordering, and pagination"""
+    # Validate order up front so a bad value is a 400, not a 500 from the query
+    order = None
+    if req.order:
+        order = _ORDER_RE.match(req.order)
+        if not order:
+            raise HTTPException(status_code=400, detail=f"Invalid order: {req.order!r} (expected 'column' or 'column.asc|desc')")
+    
     try:
         query = supabase.table(req.table).select(req.select)
         
@@ -56,12 +74,8 @@ async def query_table(req: QueryRequest, supabase=Depends(get_supabase)):
                 query = query.eq(key, value)
         
         # Apply ordering
-        if req.order:
-            if ".desc" in req.order:
-                col = req.order.replace(".desc", "")
-                query = query.order(col, desc=True)
-            else:
-                query = query.order(req.order)
+        if order:
+            query = query.order(order[1], desc=(order[2] == "desc"))
         
         # Apply limit
         if req.limit:
@@ -71,7 +85,7 @@ async def query_table(req: QueryRequest, supabase=Depends(get_supabase)):
         return {"ok": True, "data": response.data, "count": len(response.data)}
     
     except Exception as e:
-        logger.error(f"Supabase query error: {e}")
+        logger.error("Supabase query error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -83,7 +97,7 @@ async def insert_row(req: InsertRequest, supabase=Depends(get_supabase)):
         return {"ok": True, "data": response.data}
     
     except Exception as e:
-        logger.error(f"Supabase insert error: {e}")
+        logger.error("Supabase insert error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -91,17 +105,18 @@ async def insert_row(req: InsertRequest, supabase=Depends(get_supabase)):
 async def update_rows(req: UpdateRequest, supabase=Depends(get_supabase)):
     """Update rows in a Supabase table matching filters"""
     try:
-        query = supabase.table(req.table).update(req.data)
+        # Keep the default return=representation: postgrest-py reports count=0 on minimal's empty body
+        query = supabase.table(req.table).update(req.data, count=CountMethod.exact)
         
         # Apply filters
         for key, value in req.filters.items():
             query = query.eq(key, value)
         
         response = query.execute()
-        return {"ok": True, "data": response.data, "count": len(response.data)}
+        return {"ok": True, "data": response.data, "count": response.count}
     
     except Exception as e:
-        logger.error(f"Supabase update error: {e}")
+        logger.error("Supabase update error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -109,17 +124,17 @@ async def update_rows(req: UpdateRequest, supabase=Depends(get_supabase)):
 async def delete_rows(req: DeleteRequest, supabase=Depends(get_supabase)):
     """Delete rows from a Supabase table matching filters"""
     try:
-        query = supabase.table(req.table).delete()
+        query = supabase.table(req.table).delete(count=CountMethod.exact)
         
         # Apply filters
         for key, value in req.filters.items():
             query = query.eq(key, value)
         
         response = query.execute()
-        return {"ok": True, "deleted": len(response.data)}
+        return {"ok": True, "deleted": response.count}
     
     except Exception as e:
-        logger.error(f"Supabase delete error: {e}")
+        logger.error("Supabase delete error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -135,7 +150,7 @@ async def list_tables(supabase=Depends(get_supabase)):
         return {"ok": True, "tables": response.data}
     except Exception as e:
         # Fallback: return common tables or error
-        logger.warning(f"Cannot list tables: {e}")
+        logger.warning("Cannot list tables: %s", e)
         return {
             "ok": False,
             "message": "Table listing requires custom RPC function or direct postgres access",